@@ -2,56 +2,98 @@ import os
 import json
 import numpy as np
 import pandas as pd
-import torch
 import onnxruntime as ort
 import argparse
-from pathlib import Path
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, Iterator, List, Tuple, Optional
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
 from tqdm import tqdm
 from sklearn.metrics import mean_absolute_error, accuracy_score, classification_report, confusion_matrix
 import matplotlib.pyplot as plt
 import seaborn as sns
-import pickle
-import time
+import soundfile as sf
+from scipy.signal import resample_poly
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import shutil
+from math import gcd
 from datetime import datetime
-import librosa
 import warnings
 warnings.filterwarnings('ignore')
 
 
+def load_and_preprocess_audio(audio_path: str, sample_rate: int) -> Optional[np.ndarray]:
+    try:
+        audio, sr = sf.read(audio_path, dtype='float32', always_2d=False)
+        if audio.ndim > 1:
+            audio = audio.mean(axis=1, dtype=np.float32)
+        if sr != sample_rate:
+            g = gcd(sr, sample_rate)
+            audio = resample_poly(audio, sample_rate // g, sr // g)
+        return audio.astype(np.float32, copy=False)
+    except Exception as e:
+        print(f"Error loading {audio_path}: {e}")
+        return None
+
+
 class AgeGenderEvaluator:
     
+    CHECKPOINT_SCHEMA = pa.schema([
+        ('idx', pa.int64()),
+        ('audio_path', pa.string()),
+        ('skipped', pa.bool_()),
+        ('age_prediction', pa.float64()),
+        ('age_ground_truth', pa.int64()),
+        ('gender_prediction', pa.string()),
+        ('gender_ground_truth', pa.string()),
+        ('confidence_female', pa.float32()),
+        ('confidence_male', pa.float32()),
+        ('confidence_child', pa.float32())
+    ])
+    
     def __init__(
         self, 
         model_path: str,
         csv_path: str,
         audio_base_dir: str,
         output_dir: str = "./age_gender_evaluation_results",
-        checkpoint_file: str = "checkpoint.pkl",
+        checkpoint_dir: str = "checkpoint",
         sample_rate: int = 16000,
         dev_mode: bool = False,
-        dev_samples: int = 50
+        dev_samples: int = 50,
+        decode_workers: int = 4
     ):
         self.model_path = model_path
         self.csv_path = csv_path
         self.audio_base_dir = audio_base_dir
         self.output_dir = output_dir
-        self.checkpoint_path = os.path.join(output_dir, checkpoint_file)
+        self.checkpoint_dir = os.path.join(output_dir, checkpoint_dir)
         self.sample_rate = sample_rate
         self.dev_mode = dev_mode
         self.dev_samples = dev_samples
+        self.decode_workers = decode_workers
         
         os.makedirs(output_dir, exist_ok=True)
         
         print(f"Loading model: {model_path}")
+        sess_options = ort.SessionOptions()
+        sess_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        sess_options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        
         self.session = ort.InferenceSession(
             model_path,
+            sess_options=sess_options,
             providers=['CPUExecutionProvider']
         )
         
         self.input_name = self.session.get_inputs()[0].name
         self.age_output_name = self.session.get_outputs()[1].name
         self.gender_output_name = self.session.get_outputs()[2].name
+        
+        self.io_binding = self.session.io_binding()
+        self.io_binding.bind_output(self.age_output_name)
+        self.io_binding.bind_output(self.gender_output_name)
         print(f"✓ Model loaded (CPU)")
         
         print(f"\nLoading test data: {csv_path}")
@@ -67,52 +109,91 @@ class AgeGenderEvaluator:
         self.reverse_gender_map = {'female': 0, 'male': 1, 'child': 2}
     
     def load_and_preprocess_audio(self, audio_path: str) -> Optional[np.ndarray]:
-        try:
-            audio, sr = librosa.load(audio_path, sr=self.sample_rate, mono=True)
-            return audio.astype(np.float32)
-        except Exception as e:
-            print(f"Error loading {audio_path}: {e}")
-            return None
+        return load_and_preprocess_audio(audio_path, self.sample_rate)
     
-    def predict(self, audio: np.ndarray) -> Tuple[Optional[float], Optional[str], Optional[Dict]]:
-        try:
-            audio_input = audio.reshape(1, -1)
+    def _resolve_audio_path(self, row: pd.Series) -> str:
+        file_path_mp3 = row['file'].replace('.wav', '.mp3')
+        filename = os.path.basename(file_path_mp3)
+        return os.path.join(self.audio_base_dir, filename)
+    
+    def _prefetch_audio(self, start_idx: int) -> Iterator[Tuple[int, pd.Series, str, Optional[Future]]]:
+        max_pending = 2 * self.decode_workers
+        with ProcessPoolExecutor(max_workers=self.decode_workers) as executor:
+            pending = deque()
+            for idx in range(start_idx, len(self.test_df)):
+                row = self.test_df.iloc[idx]
+                audio_path = self._resolve_audio_path(row)
+                
+                future = None
+                if os.path.exists(audio_path):
+                    future = executor.submit(load_and_preprocess_audio, audio_path, self.sample_rate)
+                pending.append((idx, row, audio_path, future))
+                
+                if len(pending) >= max_pending:
+                    yield pending.popleft()
             
-            outputs = self.session.run(
-                [self.age_output_name, self.gender_output_name],
-                {self.input_name: audio_input}
-            )
+            while pending:
+                yield pending.popleft()
+    
+    def predict(self, audio: np.ndarray) -> Tuple[Optional[float], Optional[str], Optional[np.ndarray]]:
+        try:
+            audio_input = np.ascontiguousarray(audio, dtype=np.float32).reshape(1, -1)
             
-            age_logits = outputs[0]
-            gender_logits = outputs[1]
+            self.io_binding.bind_cpu_input(self.input_name, audio_input)
+            self.session.run_with_iobinding(self.io_binding)
+            age_logits, gender_logits = self.io_binding.copy_outputs_to_cpu()
             
             predicted_age = float(age_logits[0][0] * 100)
             
-            gender_probs = self._softmax(gender_logits[0])
-            predicted_gender_idx = np.argmax(gender_probs)
-            predicted_gender = self.gender_map[predicted_gender_idx]
-            
-            gender_prob_dict = {
-                self.gender_map[i]: float(gender_probs[i]) 
-                for i in range(len(gender_probs))
-            }
+            exp_g = np.exp(gender_logits[0] - gender_logits[0].max())
+            gender_probs = exp_g / exp_g.sum()
+            predicted_gender = self.gender_map[int(gender_probs.argmax())]
             
-            return predicted_age, predicted_gender, gender_prob_dict
+            return predicted_age, predicted_gender, gender_probs
             
         except Exception as e:
             print(f"Prediction error: {e}")
             return None, None, None
     
-    @staticmethod
-    def _softmax(x: np.ndarray) -> np.ndarray:
-        exp_x = np.exp(x - np.max(x))
-        return exp_x / exp_x.sum()
-    
     def load_checkpoint(self) -> Optional[Dict]:
-        if os.path.exists(self.checkpoint_path):
+        if not os.path.isdir(self.checkpoint_dir):
+            return None
+        
+        shard_names = sorted(
+            name for name in os.listdir(self.checkpoint_dir)
+            if name.startswith('shard_') and name.endswith('.parquet')
+        )
+        tables = []
+        for shard_name in shard_names:
+            shard_path = os.path.join(self.checkpoint_dir, shard_name)
+            try:
+                tables.append(pq.read_table(shard_path, schema=self.CHECKPOINT_SCHEMA))
+            except Exception as e:
+                print(f"  Checkpoint shard {shard_name} unreadable, moved to {shard_name}.corrupt: {e}")
+                os.replace(shard_path, shard_path + '.corrupt')
+                break
+        
+        if tables:
             try:
-                with open(self.checkpoint_path, 'rb') as f:
-                    checkpoint = pickle.load(f)
+                table = pa.concat_tables(tables).sort_by('idx')
+                gaps = np.flatnonzero(table['idx'].to_numpy() != np.arange(len(table)))
+                if len(gaps) > 0:
+                    table = table.slice(0, gaps[0])
+                if len(table) == 0:
+                    return None
+                processed = table.filter(pc.invert(table['skipped']))
+                checkpoint = {
+                    'age_predictions': processed['age_prediction'].to_pylist(),
+                    'age_ground_truth': processed['age_ground_truth'].to_pylist(),
+                    'gender_predictions': processed['gender_prediction'].to_pylist(),
+                    'gender_ground_truth': processed['gender_ground_truth'].to_pylist(),
+                    'gender_confidences': np.column_stack([
+                        processed[f'confidence_{name}'].to_numpy()
+                        for name in ['female', 'male', 'child']
+                    ]),
+                    'last_processed_idx': table['idx'][-1].as_py(),
+                    'skipped_files': table.filter(table['skipped'])['audio_path'].to_pylist()
+                }
                 print(f"\n✓ Resuming from sample {checkpoint['last_processed_idx'] + 1}/{len(self.test_df)}")
                 return checkpoint
             except Exception as e:
@@ -120,11 +201,14 @@ class AgeGenderEvaluator:
                 return None
         return None
     
-    def save_checkpoint(self, data: Dict):
+    def save_checkpoint(self, rows: Dict[str, List], last_idx: int):
         try:
-            checkpoint_data = {**data, 'timestamp': time.time()}
-            with open(self.checkpoint_path, 'wb') as f:
-                pickle.dump(checkpoint_data, f)
+            os.makedirs(self.checkpoint_dir, exist_ok=True)
+            table = pa.Table.from_pydict(rows, schema=self.CHECKPOINT_SCHEMA)
+            shard_name = f"shard_{last_idx:08d}.parquet"
+            tmp_path = os.path.join(self.checkpoint_dir, f".{shard_name}.tmp")
+            pq.write_table(table, tmp_path)
+            os.replace(tmp_path, os.path.join(self.checkpoint_dir, shard_name))
         except Exception as e:
             print(f"  Checkpoint save error: {e}")
     
@@ -135,12 +219,14 @@ class AgeGenderEvaluator:
         
         checkpoint = self.load_checkpoint()
         
+        gender_confidences = np.empty((len(self.test_df), len(self.gender_map)), dtype=np.float32)
+        
         if checkpoint:
             age_predictions = checkpoint['age_predictions']
             age_ground_truth = checkpoint['age_ground_truth']
             gender_predictions = checkpoint['gender_predictions']
             gender_ground_truth = checkpoint['gender_ground_truth']
-            gender_confidences = checkpoint['gender_confidences']
+            gender_confidences[:len(age_predictions)] = checkpoint['gender_confidences']
             start_idx = checkpoint['last_processed_idx'] + 1
             skipped_files = checkpoint.get('skipped_files', [])
         else:
@@ -148,52 +234,48 @@ class AgeGenderEvaluator:
             age_ground_truth = []
             gender_predictions = []
             gender_ground_truth = []
-            gender_confidences = []
             start_idx = 0
             skipped_files = []
         
-        for idx in tqdm(range(start_idx, len(self.test_df)), 
-                       desc="Evaluating", 
-                       initial=start_idx, 
-                       total=len(self.test_df)):
-            
-            row = self.test_df.iloc[idx]
-            
-            file_path_wav = row['file']
-            file_path_mp3 = file_path_wav.replace('.wav', '.mp3')
-            filename = os.path.basename(file_path_mp3)
-            audio_path = os.path.join(self.audio_base_dir, filename)
+        shard = {name: [] for name in self.CHECKPOINT_SCHEMA.names}
+        
+        for idx, row, audio_path, future in tqdm(self._prefetch_audio(start_idx), 
+                                                 desc="Evaluating", 
+                                                 initial=start_idx, 
+                                                 total=len(self.test_df)):
             
-            if not os.path.exists(audio_path):
-                skipped_files.append(audio_path)
-                continue
+            audio = future.result() if future is not None else None
+            pred_age, pred_gender, gender_probs = (None, None, None) if audio is None else self.predict(audio)
             
-            audio = self.load_and_preprocess_audio(audio_path)
-            if audio is None:
-                skipped_files.append(audio_path)
-                continue
+            shard['idx'].append(idx)
+            shard['audio_path'].append(audio_path)
             
-            pred_age, pred_gender, gender_probs = self.predict(audio)
             if pred_age is None or pred_gender is None:
                 skipped_files.append(audio_path)
-                continue
-            
-            age_predictions.append(pred_age)
-            age_ground_truth.append(row['age'])
-            gender_predictions.append(pred_gender)
-            gender_ground_truth.append(row['gender'])
-            gender_confidences.append(gender_probs)
+                shard['skipped'].append(True)
+                for name in self.CHECKPOINT_SCHEMA.names[3:]:
+                    shard[name].append(None)
+            else:
+                gender_confidences[len(age_predictions)] = gender_probs
+                age_predictions.append(pred_age)
+                age_ground_truth.append(row['age'])
+                gender_predictions.append(pred_gender)
+                gender_ground_truth.append(row['gender'])
+                
+                shard['skipped'].append(False)
+                shard['age_prediction'].append(pred_age)
+                shard['age_ground_truth'].append(int(row['age']))
+                shard['gender_prediction'].append(pred_gender)
+                shard['gender_ground_truth'].append(row['gender'])
+                shard['confidence_female'].append(float(gender_probs[0]))
+                shard['confidence_male'].append(float(gender_probs[1]))
+                shard['confidence_child'].append(float(gender_probs[2]))
             
             if (idx + 1) % 50 == 0:
-                self.save_checkpoint({
-                    'age_predictions': age_predictions,
-                    'age_ground_truth': age_ground_truth,
-                    'gender_predictions': gender_predictions,
-                    'gender_ground_truth': gender_ground_truth,
-                    'gender_confidences': gender_confidences,
-                    'last_processed_idx': idx,
-                    'skipped_files': skipped_files
-                })
+                self.save_checkpoint(shard, idx)
+                shard = {name: [] for name in self.CHECKPOINT_SCHEMA.names}
+        
+        gender_confidences = gender_confidences[:len(age_predictions)]
         
         mae_age = mean_absolute_error(age_ground_truth, age_predictions)
         gender_accuracy = accuracy_score(gender_ground_truth, gender_predictions)
@@ -247,8 +329,8 @@ class AgeGenderEvaluator:
                       f"R={metrics['recall']:.3f}, F1={metrics['f1-score']:.3f}")
         print(f"{'='*60}\n")
         
-        if os.path.exists(self.checkpoint_path):
-            os.remove(self.checkpoint_path)
+        if os.path.isdir(self.checkpoint_dir):
+            shutil.rmtree(self.checkpoint_dir)
             print("✓ Checkpoint removed")
         
         return results
@@ -277,16 +359,23 @@ class AgeGenderEvaluator:
     def save_detailed_csv(self, results: Dict, filename: str = 'detailed_results.csv'):
         output_path = os.path.join(self.output_dir, filename)
         
+        n = results['num_samples']
+        age_predicted = np.fromiter(results['age']['predictions'], dtype=np.float64, count=n)
+        age_ground_truth = np.fromiter(results['age']['ground_truth'], dtype=np.int64, count=n)
+        gender_predicted = np.asarray(results['gender']['predictions'], dtype=object)
+        gender_ground_truth = np.asarray(results['gender']['ground_truth'], dtype=object)
+        confidences = results['gender']['confidences']
+        
         df = pd.DataFrame({
-            'age_predicted': results['age']['predictions'],
-            'age_ground_truth': results['age']['ground_truth'],
-            'age_error': np.abs(np.array(results['age']['predictions']) - np.array(results['age']['ground_truth'])),
-            'gender_predicted': results['gender']['predictions'],
-            'gender_ground_truth': results['gender']['ground_truth'],
-            'gender_correct': np.array(results['gender']['predictions']) == np.array(results['gender']['ground_truth']),
-            'confidence_female': [c['female'] for c in results['gender']['confidences']],
-            'confidence_male': [c['male'] for c in results['gender']['confidences']],
-            'confidence_child': [c['child'] for c in results['gender']['confidences']]
+            'age_predicted': age_predicted,
+            'age_ground_truth': age_ground_truth,
+            'age_error': np.abs(age_predicted - age_ground_truth),
+            'gender_predicted': gender_predicted,
+            'gender_ground_truth': gender_ground_truth,
+            'gender_correct': gender_predicted == gender_ground_truth,
+            'confidence_female': confidences[:, 0],
+            'confidence_male': confidences[:, 1],
+            'confidence_child': confidences[:, 2]
         })
         
         df.to_csv(output_path, index=False)
@@ -390,6 +479,8 @@ def main():
                        help='Run in development mode')
     parser.add_argument('--dev-samples', type=int, default=50,
                        help='Number of samples for dev mode')
+    parser.add_argument('--decode-workers', type=int, default=4,
+                       help='Number of audio decoding worker processes')
     
     args = parser.parse_args()
     
@@ -410,7 +501,8 @@ def main():
         audio_base_dir=args.audio_dir,
         output_dir=args.output,
         dev_mode=args.dev,
-        dev_samples=args.dev_samples
+        dev_samples=args.dev_samples,
+        decode_workers=args.decode_workers
     )
     
     results = evaluator.evaluate()
@@ -2,10 +2,9 @@ import os
 import json
 import numpy as np
 import pandas as pd
-import torch
 import onnxruntime as ort
-from pathlib import Path
-from typing import Dict, List, Tuple, Optional
+import pyarrow.compute as pc
+from typing import Dict, List, Tuple
 from tqdm import tqdm
 from sklearn.metrics import (
     accuracy_score, 
@@ -15,12 +14,10 @@ from sklearn.metrics import (
 )
 import matplotlib.pyplot as plt
 import seaborn as sns
-import pickle
 import time
 from datetime import datetime
-import librosa
 import warnings
-from datasets import load_dataset, Dataset
+from datasets import load_dataset, Audio
 warnings.filterwarnings('ignore')
 
 
@@ -64,18 +61,31 @@ class EmotionRecognitionEvaluator:
         self.dev_mode = dev_mode
         self.dev_samples = dev_samples
         
+        self._name_to_id = {v: k for k, v in self.EMOTION_LABELS.items()}
+        self._ssi_to_id = {ssi: self._name_to_id[name] for ssi, name in self.SSI_TO_MODEL_MAPPING.items()}
+        
         os.makedirs(output_dir, exist_ok=True)
         
         print(f"Loading model: {model_path}")
+        sess_options = ort.SessionOptions()
+        sess_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        sess_options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        
         self.session = ort.InferenceSession(
             model_path,
+            sess_options=sess_options,
             providers=['CPUExecutionProvider']
         )
         
         self.input_name = self.session.get_inputs()[0].name
         self.output_name = self.session.get_outputs()[0].name
+        
+        self.io_binding = self.session.io_binding()
+        self.io_binding.bind_output(self.output_name)
         print(f"✓ Model loaded (CPU)")
         
+        self._warmup()
+        
         print(f"\nLoading SSI dataset...")
         self.dataset = self._load_dataset()
         
@@ -86,6 +96,13 @@ class EmotionRecognitionEvaluator:
             print(f"Samples: {dev_samples}")
         print(f"{'='*60}\n")
     
+    def _warmup(self):
+        try:
+            dummy = np.zeros((1, self.sample_rate), dtype=np.float32)
+            self.session.run([self.output_name], {self.input_name: dummy})
+        except Exception as e:
+            print(f"  Warm-up skipped: {e}")
+    
     def _load_dataset(self):
         ds = load_dataset("stapesai/ssi-speech-emotion-recognition")
         dataset = ds['validation']
@@ -96,25 +113,36 @@ class EmotionRecognitionEvaluator:
             dataset = dataset.select(range(min(self.dev_samples, len(dataset))))
             print(f"  Dev mode: {len(dataset)} samples")
         
+        encoded_audio = dataset.with_format('arrow')['file_path']
+        encoded_sizes = pc.binary_length(pc.struct_field(encoded_audio, 'bytes')).to_pylist()
+        if None in encoded_sizes:
+            audio_paths = pc.struct_field(encoded_audio, 'path').to_pylist()
+            encoded_sizes = [
+                size if size is not None else os.path.getsize(path)
+                for size, path in zip(encoded_sizes, audio_paths)
+            ]
+        self.sample_order = np.argsort(encoded_sizes, kind='stable')[::-1].tolist()
+        dataset = dataset.select(self.sample_order)
+        print("  Ordered by encoded size (longest first)")
+        
+        dataset = dataset.cast_column('file_path', Audio(sampling_rate=self.sample_rate, mono=True))
+        
         return dataset
     
-    def _preprocess_audio(self, audio_array: np.ndarray, original_sr: int) -> np.ndarray:
-        if original_sr != self.sample_rate:
-            audio_array = librosa.resample(
-                audio_array, 
-                orig_sr=original_sr, 
-                target_sr=self.sample_rate
-            )
+    def _preprocess_audio(self, audio_array: np.ndarray) -> np.ndarray:
+        audio_array = audio_array.astype(np.float32)
         
-        if np.abs(audio_array).max() > 0:
-            audio_array = audio_array / np.abs(audio_array).max()
+        max_amplitude = max(audio_array.max(), -audio_array.min())
+        if max_amplitude > 0:
+            audio_array /= max_amplitude
         
         return audio_array
     
     def _predict_emotion(self, audio_array: np.ndarray) -> Tuple[int, np.ndarray]:
-        input_values = audio_array.astype(np.float32).reshape(1, -1)
-        outputs = self.session.run([self.output_name], {self.input_name: input_values})
-        logits = outputs[0][0]
+        input_values = np.ascontiguousarray(audio_array, dtype=np.float32).reshape(1, -1)
+        self.io_binding.bind_cpu_input(self.input_name, input_values)
+        self.session.run_with_iobinding(self.io_binding)
+        logits = self.io_binding.copy_outputs_to_cpu()[0][0]
         predicted_emotion = int(np.argmax(logits))
         return predicted_emotion, logits
     
@@ -123,40 +151,39 @@ class EmotionRecognitionEvaluator:
         print("STARTING EVALUATION")
         print(f"{'='*60}\n")
         
-        predictions = []
-        ground_truth = []
-        all_logits = []
+        num_samples = len(self.dataset)
+        predictions = np.empty(num_samples, dtype=np.int64)
+        ground_truth = np.empty(num_samples, dtype=np.int64)
+        all_logits = np.empty((num_samples, len(self.EMOTION_LABELS)), dtype=np.float32)
+        sample_indices = np.empty(num_samples, dtype=np.int64)
+        num_predicted = 0
         failed_samples = []
         
         start_time = time.time()
         
-        for idx, sample in enumerate(tqdm(self.dataset, desc="Evaluating")):
+        for idx, sample in tqdm(zip(self.sample_order, self.dataset), total=num_samples, desc="Evaluating"):
             try:
                 audio_data = sample['file_path']
                 
                 if isinstance(audio_data, dict) and 'array' in audio_data:
-                    audio_array = np.array(audio_data['array'])
-                    audio_sr = audio_data['sampling_rate']
+                    audio_array = audio_data['array']
                 else:
                     failed_samples.append(idx)
                     continue
                 
-                ssi_emotion_label = sample['emotion']
-                
-                if ssi_emotion_label not in self.SSI_TO_MODEL_MAPPING:
+                true_emotion = self._ssi_to_id.get(sample['emotion'])
+                if true_emotion is None:
                     failed_samples.append(idx)
                     continue
                 
-                model_emotion_name = self.SSI_TO_MODEL_MAPPING[ssi_emotion_label]
-                emotion_name_to_id = {v: k for k, v in self.EMOTION_LABELS.items()}
-                true_emotion = emotion_name_to_id[model_emotion_name]
-                
-                processed_audio = self._preprocess_audio(audio_array, audio_sr)
+                processed_audio = self._preprocess_audio(audio_array)
                 pred_emotion, logits = self._predict_emotion(processed_audio)
                 
-                predictions.append(pred_emotion)
-                ground_truth.append(true_emotion)
-                all_logits.append(logits)
+                predictions[num_predicted] = pred_emotion
+                ground_truth[num_predicted] = true_emotion
+                all_logits[num_predicted] = logits
+                sample_indices[num_predicted] = idx
+                num_predicted += 1
                 
             except Exception as e:
                 print(f"\n⚠️  Error on sample {idx}: {e}")
@@ -166,17 +193,23 @@ class EmotionRecognitionEvaluator:
         end_time = time.time()
         eval_time = end_time - start_time
         
+        dataset_order = np.argsort(sample_indices[:num_predicted], kind='stable')
+        
         results = self._calculate_metrics(
-            predictions, ground_truth, all_logits, eval_time, failed_samples
+            predictions[dataset_order],
+            ground_truth[dataset_order],
+            all_logits[dataset_order],
+            eval_time,
+            sorted(failed_samples)
         )
         
         return results
     
     def _calculate_metrics(
         self, 
-        predictions: List[int], 
-        ground_truth: List[int],
-        all_logits: List[np.ndarray],
+        predictions: np.ndarray, 
+        ground_truth: np.ndarray,
+        all_logits: np.ndarray,
         eval_time: float,
         failed_samples: List[int]
     ) -> Dict:
@@ -225,9 +258,9 @@ class EmotionRecognitionEvaluator:
             },
             'confusion_matrix': cm.tolist(),
             'classification_report': class_report,
-            'predictions': predictions,
-            'ground_truth': ground_truth,
-            'logits': [l.tolist() for l in all_logits],
+            'predictions': predictions.tolist(),
+            'ground_truth': ground_truth.tolist(),
+            'logits': all_logits,
             'metadata': {
                 'total_samples': len(predictions),
                 'failed_samples': len(failed_samples),
@@ -1,17 +1,22 @@
 import os
 import json
 import numpy as np
-import torch
-from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 from tqdm import tqdm
-from datasets import load_dataset, Dataset
-from sklearn.metrics import accuracy_score, classification_report, confusion_matrix
+from datasets import load_dataset, Dataset, Audio
+from sklearn.metrics import accuracy_score, classification_report
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import shutil
+import matplotlib
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 import seaborn as sns
-import threading
-import time
+from scipy.signal import resample_poly
+from math import gcd
+import signal
+from concurrent.futures import ThreadPoolExecutor
 
 WHISPER_99_LANGUAGES = [
     'en', 'zh', 'de', 'es', 'ru', 'ko', 'fr', 'ja', 'pt', 'tr',
@@ -70,6 +75,14 @@ WHISPER_TO_FLEURS_LANGUAGE_NAMES = {
 
 class WhisperFLEURSEvaluator:
     
+    CHECKPOINT_SCHEMA = pa.schema([
+        ('ground_truth', pa.string()),
+        ('prediction', pa.string()),
+        ('confidence', pa.float32())
+    ])
+    
+    FEATURE_CACHE_VERSION = 3
+    
     def __init__(
         self, 
         model_path: str,
@@ -79,7 +92,9 @@ class WhisperFLEURSEvaluator:
         dev_samples: int = 100,
         use_82_languages: bool = True,
         eval_whisper_subset: bool = True,
-        eval_full_102: bool = True
+        eval_full_102: bool = True,
+        batch_size: int = 16,
+        inference_workers: int = 4
     ):
         self.model_path = model_path
         self.cache_dir = cache_dir
@@ -89,14 +104,27 @@ class WhisperFLEURSEvaluator:
         self.use_82_languages = use_82_languages
         self.eval_whisper_subset = eval_whisper_subset
         self.eval_full_102 = eval_full_102
+        self.batch_size = batch_size
+        self.inference_workers = inference_workers
+        self._audio_batch = np.zeros((batch_size, 30 * 16000), dtype=np.float32)
+        
+        self.feature_cache_path = os.path.join(output_dir, "features_cache.npy")
+        self.feature_cache_meta_path = os.path.join(output_dir, "features_cache.meta.json")
+        self._feature_cache = None
+        self._feature_cached = None
+        self._feature_cache_key = None
+        self._feature_cache_writable = False
+        
+        self._inference_executor = ThreadPoolExecutor(max_workers=inference_workers)
         
-        self.paused = False
-        self.pause_lock = threading.Lock()
         self.stop_requested = False
-        self.keyboard_thread = None
         
         self.num_whisper_langs = 82 if use_82_languages else 99
         self.whisper_eval_langs = WHISPER_82_HIGH_RESOURCE if use_82_languages else WHISPER_99_LANGUAGES
+        self._idx_to_name = np.array(
+            [WHISPER_TO_FLEURS_LANGUAGE_NAMES.get(code) or f"[Whisper-{code}]" for code in WHISPER_99_LANGUAGES] + ['unknown'],
+            dtype=object
+        )
         
         if not eval_whisper_subset and not eval_full_102:
             raise ValueError("At least one evaluation must be enabled")
@@ -121,18 +149,23 @@ class WhisperFLEURSEvaluator:
     def load_model(self):
         import onnxruntime as ort
         
-        preprocessor_path = "whisper_preprocessor.onnx"
-        detector_path = "whisper_lang_detector.onnx"
+        preprocessor_path = os.path.join(os.path.dirname(self.model_path), "whisper_preprocessor.onnx")
+        detector_path = self.model_path
+        self.preprocessor_path = preprocessor_path
         
         if not os.path.exists(preprocessor_path):
             raise FileNotFoundError(f"Preprocessor model not found: {preprocessor_path}")
         if not os.path.exists(detector_path):
             raise FileNotFoundError(f"Detector model not found: {detector_path}")
         
-        providers = ['CPUExecutionProvider']
+        providers = [('CPUExecutionProvider', {'arena_extend_strategy': 'kSameAsRequested'})]
         
         sess_options = ort.SessionOptions()
         sess_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        sess_options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        sess_options.intra_op_num_threads = max(1, (os.cpu_count() or 2) // self.inference_workers)
+        sess_options.enable_mem_pattern = True
+        sess_options.enable_cpu_mem_arena = True
         
         self.preprocessor_session = ort.InferenceSession(
             preprocessor_path, sess_options=sess_options, providers=providers
@@ -141,48 +174,15 @@ class WhisperFLEURSEvaluator:
             detector_path, sess_options=sess_options, providers=providers
         )
         
-        print(f"✓ Models loaded (CPU)")
-    
-    def _keyboard_listener(self):
-        print("\nKEYBOARD CONTROLS: 'p' PAUSE | 'r' RESUME | 'q' QUIT\n")
+        detector_input_type = self.detector_session.get_inputs()[0].type
+        self.detector_input_dtype = np.float16 if detector_input_type == 'tensor(float16)' else np.float32
         
-        while not self.stop_requested:
-            try:
-                user_input = input().strip().lower()
-                
-                if user_input == 'p':
-                    with self.pause_lock:
-                        if not self.paused:
-                            self.paused = True
-                            print("\n⏸️  PAUSED - Press 'r' to resume\n")
-                
-                elif user_input == 'r':
-                    with self.pause_lock:
-                        if self.paused:
-                            self.paused = False
-                            print("\n▶️  RESUMED\n")
-                
-                elif user_input == 'q':
-                    with self.pause_lock:
-                        self.stop_requested = True
-                        print("\n🛑 STOPPING - Saving progress...\n")
-                    break
-                
-            except (EOFError, Exception):
-                break
+        print(f"✓ Models loaded (CPU)")
     
-    def _start_keyboard_listener(self):
-        self.keyboard_thread = threading.Thread(target=self._keyboard_listener, daemon=True)
-        self.keyboard_thread.start()
-    
-    def _check_pause(self):
-        while True:
-            with self.pause_lock:
-                if self.stop_requested:
-                    return True
-                if not self.paused:
-                    return False
-            time.sleep(0.1)
+    def _request_stop(self, signum, frame):
+        if not self.stop_requested:
+            self.stop_requested = True
+            print("\n🛑 STOPPING - Saving progress...\n")
     
     def download_fleurs(self, subset: str = "all") -> Dict[str, Dataset]:
         print(f"\nDownloading FLEURS dataset (subset: {subset})")
@@ -190,123 +190,256 @@ class WhisperFLEURSEvaluator:
         print(f"Dataset downloaded - Test split: {len(dataset['test'])} samples")
         return dataset
     
-    def _predict_language(self, audio_array: np.ndarray, sample_rate: int) -> Tuple[str, float]:
-        if sample_rate != 16000:
-            from scipy import signal
-            num_samples = int(len(audio_array) * 16000 / sample_rate)
-            audio_array = signal.resample(audio_array, num_samples)
-        
-        max_samples = 30 * 16000
-        if len(audio_array) > max_samples:
-            audio_array = audio_array[:max_samples]
-        
-        max_amplitude = np.max(np.abs(audio_array))
-        if max_amplitude > 0:
-            audio_array = audio_array / max_amplitude
-        
-        audio_input = audio_array.astype(np.float32).reshape(1, -1)
+    def _feature_cache_fingerprint(self, num_samples: int) -> Dict:
+        preprocessor_stat = os.stat(self.preprocessor_path)
+        return {
+            'version': self.FEATURE_CACHE_VERSION,
+            'num_samples': num_samples,
+            'dtype': np.dtype(self.detector_input_dtype).name,
+            'preprocessor_path': os.path.abspath(self.preprocessor_path),
+            'preprocessor_size': preprocessor_stat.st_size,
+            'preprocessor_mtime': preprocessor_stat.st_mtime
+        }
+    
+    def _open_feature_cache(self, num_samples: int):
+        self._feature_cached = np.zeros(num_samples, dtype=bool)
+        self._feature_cache_key = self._feature_cache_fingerprint(num_samples)
         
+        if os.path.exists(self.feature_cache_path) and os.path.exists(self.feature_cache_meta_path):
+            try:
+                with open(self.feature_cache_meta_path, 'r') as f:
+                    meta = json.load(f)
+                if meta.get('fingerprint') == self._feature_cache_key:
+                    self._feature_cache = np.lib.format.open_memmap(self.feature_cache_path, mode='r+')
+                    self._feature_cached[meta['cached_indices']] = True
+                    print(f"✓ Feature cache: {len(meta['cached_indices']):,} samples reused")
+                else:
+                    print("Feature cache is out of date - recomputing")
+            except Exception as e:
+                print(f"Warning: Could not load feature cache: {e}")
+                self._feature_cache = None
+                self._feature_cached[:] = False
+    
+    def _store_features(self, idx: int, features_2d: np.ndarray):
+        if self._feature_cache is None:
+            self._feature_cache = np.lib.format.open_memmap(
+                self.feature_cache_path, mode='w+', dtype=self.detector_input_dtype,
+                shape=(len(self._feature_cached),) + features_2d.shape
+            )
+        self._feature_cache[idx] = features_2d
+        self._feature_cached[idx] = True
+    
+    def _save_feature_cache_meta(self):
+        if self._feature_cache is None:
+            return
+        self._feature_cache.flush()
+        meta = {
+            'fingerprint': self._feature_cache_key,
+            'cached_indices': np.flatnonzero(self._feature_cached).tolist()
+        }
+        try:
+            with open(self.feature_cache_meta_path, 'w') as f:
+                json.dump(meta, f)
+        except Exception as e:
+            print(f"Warning: Could not save feature cache: {e}")
+    
+    def _remove_feature_cache(self):
+        self._feature_cache = None
+        self._feature_cached = None
+        try:
+            for path in [self.feature_cache_meta_path, self.feature_cache_path]:
+                if os.path.exists(path):
+                    os.remove(path)
+            print("✓ Feature cache removed")
+        except Exception as e:
+            print(f"Warning: Could not remove feature cache: {e}")
+    
+    def _preprocess(self, audio_input: np.ndarray) -> np.ndarray:
         preprocessor_outputs = self.preprocessor_session.run(None, {"audio_pcm": audio_input})
-        preprocessed_features = preprocessor_outputs[0]
-        features_2d = preprocessed_features[0]
-        
+        return preprocessor_outputs[0][0]
+    
+    def _detect(self, features_2d: np.ndarray) -> np.ndarray:
+        features_2d = features_2d.astype(self.detector_input_dtype, copy=False)
         detector_outputs = self.detector_session.run(None, {"input_features": features_2d})
-        language_probs = detector_outputs[0]
-        
-        if len(language_probs.shape) == 2:
-            language_probs = language_probs[0]
-        
-        top_idx = np.argmax(language_probs)
-        top_confidence = float(language_probs[top_idx])
+        return detector_outputs[0].reshape(-1)
+    
+    def _preprocess_and_detect(self, audio_input: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        features_2d = self._preprocess(audio_input)
+        return features_2d, self._detect(features_2d)
+    
+    def _predict_language_batch(
+        self, 
+        audio_list: List[np.ndarray], 
+        sample_rates: List[int],
+        indices: Optional[List[int]] = None
+    ) -> Tuple[List[str], List[float]]:
+        max_samples = 30 * 16000
+        features = [None] * len(audio_list)
+        
+        if indices is not None and self._feature_cache is not None:
+            for i, idx in enumerate(indices):
+                if self._feature_cached[idx]:
+                    features[i] = self._feature_cache[idx]
+        
+        pending = [i for i, features_2d in enumerate(features) if features_2d is None]
+        batch = self._audio_batch[:len(pending)]
+        lengths = []
+        
+        for row, i in enumerate(pending):
+            audio_array = audio_list[i]
+            sample_rate = sample_rates[i]
+            if sample_rate != 16000:
+                g = gcd(sample_rate, 16000)
+                audio_array = resample_poly(audio_array.astype(np.float32, copy=False), 16000 // g, sample_rate // g)
+            
+            n = min(len(audio_array), max_samples)
+            audio_row = batch[row, :n]
+            audio_row[:] = audio_array[:n]
+            max_amplitude = max(audio_row.max(), -audio_row.min())
+            if max_amplitude > 0:
+                audio_row /= max_amplitude
+            lengths.append(n)
+        
+        futures = [None] * len(features)
+        for row, (i, n) in enumerate(zip(pending, lengths)):
+            futures[i] = self._inference_executor.submit(self._preprocess_and_detect, batch[row:row + 1, :n])
+        for i, features_2d in enumerate(features):
+            if features_2d is not None:
+                futures[i] = self._inference_executor.submit(self._detect, features_2d)
+        
+        language_probs = []
+        for i, future in enumerate(futures):
+            if i in pending:
+                features[i], probs = future.result()
+                if indices is not None and self._feature_cache_writable:
+                    self._store_features(indices[i], features[i])
+            else:
+                probs = future.result()
+            language_probs.append(probs)
         
-        predicted_lang_code = WHISPER_99_LANGUAGES[top_idx] if top_idx < len(WHISPER_99_LANGUAGES) else 'unknown'
-        predicted_lang_name = WHISPER_TO_FLEURS_LANGUAGE_NAMES.get(predicted_lang_code, predicted_lang_code)
+        language_probs = np.stack(language_probs)
+        top_indices = language_probs.argmax(axis=1)
+        top_confidences = language_probs[np.arange(len(top_indices)), top_indices]
         
-        if predicted_lang_name is None:
-            predicted_lang_name = f"[Whisper-{predicted_lang_code}]"
+        predicted_lang_names = self._idx_to_name[np.minimum(top_indices, len(WHISPER_99_LANGUAGES))]
         
-        return predicted_lang_name, top_confidence
+        return predicted_lang_names.tolist(), top_confidences.tolist()
+    
+    def _predict_language(self, audio_array: np.ndarray, sample_rate: int, idx: Optional[int] = None) -> Tuple[str, float]:
+        indices = None if idx is None else [idx]
+        predicted_lang_names, top_confidences = self._predict_language_batch([audio_array], [sample_rate], indices)
+        return predicted_lang_names[0], top_confidences[0]
     
     def evaluate_subset(
         self, 
         dataset: Dataset, 
         language_subset: List[str] = None,
-        max_samples_per_lang: int = None
+        max_samples_per_lang: int = None,
+        checkpoint_name: str = "checkpoint"
     ) -> Dict:
-        predictions = []
-        ground_truth = []
-        confidences = []
+        if language_subset:
+            languages = np.asarray(dataset['language'], dtype=object)
+            in_subset = np.isin(languages, list(language_subset))
         
         if self.dev_mode:
             eval_indices = list(range(min(self.dev_samples, len(dataset))))
             if language_subset:
-                filtered_indices = [
-                    idx for idx in eval_indices 
-                    if dataset[idx]['language'] in language_subset
-                ]
-                eval_indices = filtered_indices
+                eval_indices = [idx for idx in eval_indices if in_subset[idx]]
             print(f"DEV MODE: {len(eval_indices)} samples")
         else:
             if language_subset:
-                samples_by_lang = {}
-                for idx, sample in enumerate(tqdm(dataset, desc="Scanning")):
-                    lang_name = sample['language']
-                    if lang_name in language_subset:
-                        if lang_name not in samples_by_lang:
-                            samples_by_lang[lang_name] = []
-                        samples_by_lang[lang_name].append(idx)
+                candidate_indices = np.flatnonzero(in_subset)
+                candidate_indices = candidate_indices[np.argsort(languages[candidate_indices], kind='stable')]
                 
-                eval_indices = []
-                for lang, indices in sorted(samples_by_lang.items()):
-                    if max_samples_per_lang:
-                        indices = indices[:max_samples_per_lang]
-                    eval_indices.extend(indices)
+                if max_samples_per_lang:
+                    candidate_langs = pd.Series(languages[candidate_indices])
+                    rank_in_lang = candidate_langs.groupby(candidate_langs).cumcount().to_numpy()
+                    candidate_indices = candidate_indices[rank_in_lang < max_samples_per_lang]
                 
+                eval_indices = candidate_indices.tolist()
                 print(f"Evaluating {len(eval_indices):,} samples")
             else:
                 eval_indices = range(len(dataset))
         
+        predictions = np.empty(len(eval_indices), dtype=object)
+        ground_truth = np.empty(len(eval_indices), dtype=object)
+        confidences = np.empty(len(eval_indices), dtype=np.float32)
+        num_evaluated = 0
+        
         successful = 0
         failed = 0
         
-        self._start_keyboard_listener()
-        
-        progress_bar = tqdm(eval_indices, desc="Evaluating", unit="samples", ncols=100)
+        checkpoint_dir = os.path.join(self.output_dir, checkpoint_name)
+        shutil.rmtree(checkpoint_dir, ignore_errors=True)
+        checkpointed = 0
         
-        for idx in progress_bar:
-            should_stop = self._check_pause()
-            if should_stop:
-                print("\n🛑 STOPPED - Saving partial results")
-                break
+        previous_sigint_handler = signal.signal(signal.SIGINT, self._request_stop)
+        try:
+            print("\nCTRL+C: stop and save partial results\n")
             
-            sample = dataset[int(idx)]
-            audio_array = np.array(sample['audio']['array'])
-            sample_rate = sample['audio']['sampling_rate']
-            true_lang_name = sample['language']
+            progress_bar = tqdm(total=len(eval_indices), desc="Evaluating", unit="samples", ncols=100)
             
-            try:
-                pred_lang_name, confidence = self._predict_language(audio_array, sample_rate)
-                successful += 1
-            except Exception as e:
-                failed += 1
-                if failed == 1:
-                    print(f"\n⚠️  Error on sample {idx}: {e}")
-                pred_lang_name = 'unknown'
-                confidence = 0.0
+            batches = dataset.select(eval_indices).iter(batch_size=self.batch_size)
+            
+            for start, batch in zip(range(0, len(eval_indices), self.batch_size), batches):
+                if self.stop_requested:
+                    print("\n🛑 STOPPED - Saving partial results")
+                    break
+                
+                batch_indices = [int(idx) for idx in eval_indices[start:start + self.batch_size]]
+                audio_list = [audio['array'] for audio in batch['audio']]
+                sample_rates = [audio['sampling_rate'] for audio in batch['audio']]
+                
+                try:
+                    pred_lang_names, pred_confidences = self._predict_language_batch(audio_list, sample_rates, batch_indices)
+                    successful += len(batch_indices)
+                except Exception:
+                    pred_lang_names = []
+                    pred_confidences = []
+                    for idx, audio_array, sample_rate in zip(batch_indices, audio_list, sample_rates):
+                        try:
+                            pred_lang_name, confidence = self._predict_language(audio_array, sample_rate, idx)
+                            successful += 1
+                        except Exception as e:
+                            failed += 1
+                            if failed == 1:
+                                print(f"\n⚠️  Error on sample {idx}: {e}")
+                            pred_lang_name = 'unknown'
+                            confidence = 0.0
+                        pred_lang_names.append(pred_lang_name)
+                        pred_confidences.append(confidence)
+                
+                batch_end = num_evaluated + len(batch_indices)
+                predictions[num_evaluated:batch_end] = pred_lang_names
+                ground_truth[num_evaluated:batch_end] = batch['language']
+                confidences[num_evaluated:batch_end] = pred_confidences
+                num_evaluated = batch_end
+                
+                checkpoint_end = num_evaluated - num_evaluated % 1000
+                if checkpoint_end > checkpointed:
+                    self._save_intermediate_results(
+                        checkpoint_dir, checkpointed, predictions[checkpointed:checkpoint_end],
+                        ground_truth[checkpointed:checkpoint_end], confidences[checkpointed:checkpoint_end]
+                    )
+                    checkpointed = checkpoint_end
+                
+                progress_bar.update(len(batch_indices))
+                progress_bar.set_postfix({'success': successful, 'failed': failed})
             
-            predictions.append(pred_lang_name)
-            ground_truth.append(true_lang_name)
-            confidences.append(confidence)
+            progress_bar.close()
             
-            progress_bar.set_postfix({'success': successful, 'failed': failed})
+            predictions = predictions[:num_evaluated]
+            ground_truth = ground_truth[:num_evaluated]
+            confidences = confidences[:num_evaluated]
             
-            if len(predictions) % 1000 == 0 and len(predictions) > 0:
-                self._save_intermediate_results(
-                    predictions, ground_truth, confidences, 
-                    f"checkpoint_{len(predictions)}.pkl"
-                )
+            self._save_intermediate_results(
+                checkpoint_dir, checkpointed, predictions[checkpointed:],
+                ground_truth[checkpointed:], confidences[checkpointed:]
+            )
+        finally:
+            signal.signal(signal.SIGINT, previous_sigint_handler)
         
-        self.stop_requested = True
+        self._save_feature_cache_meta()
         
         print(f"\n{'='*60}")
         print(f"✓ Success: {successful:,} ({successful/len(predictions)*100:.1f}%)")
@@ -322,6 +455,9 @@ class WhisperFLEURSEvaluator:
             output_dict=True, zero_division=0
         )
         
+        cm_labels = sorted(set(ground_truth) | set(predictions))
+        full_cm = self._confusion_counts(ground_truth, predictions, cm_labels)
+        
         return {
             'accuracy': accuracy,
             'num_samples': len(predictions),
@@ -331,6 +467,8 @@ class WhisperFLEURSEvaluator:
             'ground_truth': ground_truth,
             'confidences': confidences,
             'classification_report': report,
+            'full_cm': full_cm,
+            'cm_labels': cm_labels,
             'dev_mode': self.dev_mode,
             'successful_predictions': successful,
             'failed_predictions': failed
@@ -356,28 +494,36 @@ class WhisperFLEURSEvaluator:
         print(f"✓ Results saved: {output_path}")
         
         csv_path = output_path.replace('.json', '_detailed.csv')
+        ground_truth = np.asarray(results['ground_truth'], dtype=object)
+        predictions = np.asarray(results['predictions'], dtype=object)
         df = pd.DataFrame({
-            'ground_truth': results['ground_truth'],
-            'prediction': results['predictions'],
-            'confidence': results['confidences'],
-            'correct': [gt == pred for gt, pred in zip(results['ground_truth'], results['predictions'])]
+            'ground_truth': ground_truth,
+            'prediction': predictions,
+            'confidence': np.asarray(results['confidences'], dtype=np.float64),
+            'correct': ground_truth == predictions
         })
         df.to_csv(csv_path, index=False)
         print(f"✓ CSV saved: {csv_path}")
     
+    def _confusion_counts(self, ground_truth, predictions, labels: List[str]) -> np.ndarray:
+        num_labels = len(labels)
+        gt_ids = pd.Categorical(ground_truth, categories=labels).codes.astype(np.int64)
+        pred_ids = pd.Categorical(predictions, categories=labels).codes.astype(np.int64)
+        valid = (gt_ids >= 0) & (pred_ids >= 0)
+        counts = np.bincount(num_labels * gt_ids[valid] + pred_ids[valid], minlength=num_labels * num_labels)
+        return counts.reshape(num_labels, num_labels)
+    
+    def _slice_confusion(self, results: Dict, langs: List[str]) -> np.ndarray:
+        label_index = {label: i for i, label in enumerate(results['cm_labels'])}
+        ix = [label_index[lang] for lang in langs]
+        return results['full_cm'][np.ix_(ix, ix)]
+    
     def plot_confusion_matrix(self, results: Dict, filename: str, top_n: int = 20):
         from collections import Counter
         lang_counts = Counter(results['ground_truth'])
         top_langs = [lang for lang, _ in lang_counts.most_common(top_n)]
         
-        filtered_gt = []
-        filtered_pred = []
-        for gt, pred in zip(results['ground_truth'], results['predictions']):
-            if gt in top_langs:
-                filtered_gt.append(gt)
-                filtered_pred.append(pred if pred in top_langs else 'other')
-        
-        cm = confusion_matrix(filtered_gt, filtered_pred, labels=top_langs)
+        cm = self._slice_confusion(results, top_langs)
         
         plt.figure(figsize=(12, 10))
         sns.heatmap(cm, annot=True, fmt='d', cmap='Blues', 
@@ -404,34 +550,32 @@ class WhisperFLEURSEvaluator:
         
         print(f"\nGenerating {num_plots} confusion matrices...")
         
+        fig = plt.figure()
+        
         for plot_idx in range(num_plots):
             start_idx = plot_idx * langs_per_plot
             end_idx = min((plot_idx + 1) * langs_per_plot, len(all_langs))
             group_langs = all_langs[start_idx:end_idx]
             
-            filtered_gt = []
-            filtered_pred = []
-            for gt, pred in zip(results['ground_truth'], results['predictions']):
-                if gt in group_langs:
-                    filtered_gt.append(gt)
-                    filtered_pred.append(pred if pred in group_langs else 'other')
-            
-            if len(filtered_gt) == 0:
-                continue
-            
-            cm = confusion_matrix(filtered_gt, filtered_pred, labels=group_langs)
+            cm = self._slice_confusion(results, group_langs)
             
             fig_size = max(12, len(group_langs) * 0.5)
-            plt.figure(figsize=(fig_size, fig_size))
-            sns.heatmap(cm, annot=True, fmt='d', cmap='Blues', 
-                        xticklabels=group_langs, yticklabels=group_langs,
-                        cbar_kws={'label': 'Count'})
-            plt.title(f'Confusion Matrix - Languages {start_idx+1}-{end_idx}')
-            plt.ylabel('True Language')
-            plt.xlabel('Predicted Language')
-            plt.xticks(rotation=45, ha='right')
-            plt.yticks(rotation=0)
-            plt.tight_layout()
+            fig.clear()
+            fig.set_size_inches(fig_size, fig_size)
+            ax = fig.add_subplot()
+            image = ax.imshow(cm, cmap='Blues', aspect='auto')
+            fig.colorbar(image, ax=ax, label='Count')
+            if len(group_langs) <= 25:
+                threshold = cm.max() / 2
+                for (row, col), count in np.ndenumerate(cm):
+                    ax.text(col, row, str(count), ha='center', va='center',
+                            color='white' if count > threshold else 'black')
+            ax.set_xticks(range(len(group_langs)), group_langs, rotation=45, ha='right')
+            ax.set_yticks(range(len(group_langs)), group_langs)
+            ax.set_title(f'Confusion Matrix - Languages {start_idx+1}-{end_idx}')
+            ax.set_ylabel('True Language')
+            ax.set_xlabel('Predicted Language')
+            fig.tight_layout()
             
             if self.dev_mode:
                 output_filename = f"dev_{base_filename}_group{plot_idx+1}.png"
@@ -439,8 +583,9 @@ class WhisperFLEURSEvaluator:
                 output_filename = f"{base_filename}_group{plot_idx+1}.png"
             
             output_path = os.path.join(self.output_dir, output_filename)
-            plt.savefig(output_path, dpi=300, bbox_inches='tight')
-            plt.close()
+            fig.savefig(output_path, dpi=300, bbox_inches='tight')
+        
+        plt.close(fig)
         
         print(f"✓ All confusion matrices saved")
     
@@ -451,7 +596,7 @@ class WhisperFLEURSEvaluator:
         
         dataset_subset = "en_us" if self.dev_mode else "all"
         dataset = self.download_fleurs(subset=dataset_subset)
-        test_data = dataset['test']
+        test_data = dataset['test'].cast_column('audio', Audio(sampling_rate=16000, mono=True))
         
         all_fleurs_langs = sorted(list(set(test_data['language'])))
         
@@ -462,6 +607,10 @@ class WhisperFLEURSEvaluator:
         ])
         fleurs_whisper_langs = [lang for lang in all_fleurs_langs if lang in whisper_lang_names]
         
+        if self.eval_whisper_subset and self.eval_full_102 and not self.dev_mode:
+            self._open_feature_cache(len(test_data))
+            self._feature_cache_writable = True
+        
         results_whisper = None
         if self.eval_whisper_subset:
             print(f"\n{'='*60}")
@@ -469,8 +618,10 @@ class WhisperFLEURSEvaluator:
             print(f"{'='*60}")
             
             results_whisper = self.evaluate_subset(
-                test_data, language_subset=fleurs_whisper_langs, max_samples_per_lang=None
+                test_data, language_subset=fleurs_whisper_langs, max_samples_per_lang=None,
+                checkpoint_name=f'checkpoint_{self.num_whisper_langs}_languages'
             )
+            self._feature_cache_writable = False
             
             print(f"\nAccuracy: {results_whisper['accuracy']*100:.2f}%")
             print(f"Samples: {results_whisper['num_samples']:,}")
@@ -482,12 +633,18 @@ class WhisperFLEURSEvaluator:
                 self.plot_all_confusion_matrices(results_whisper, f'confusion_matrix_{self.num_whisper_langs}_complete', langs_per_plot=25)
         
         results_102 = None
-        if self.eval_full_102 and not self.dev_mode:
+        if self.eval_full_102 and not self.dev_mode and not self.stop_requested:
             print(f"\n{'='*60}")
             print("EVALUATION 2: Full 102-Language Set")
             print(f"{'='*60}")
             
-            results_102 = self.evaluate_subset(test_data, language_subset=None, max_samples_per_lang=None)
+            results_102 = self.evaluate_subset(
+                test_data, language_subset=None, max_samples_per_lang=None,
+                checkpoint_name='checkpoint_102_languages'
+            )
+            
+            if self._feature_cached is not None and not self.stop_requested:
+                self._remove_feature_cache()
             
             print(f"\nAccuracy: {results_102['accuracy']*100:.2f}%")
             print(f"Samples: {results_102['num_samples']:,}")
@@ -524,18 +681,20 @@ class WhisperFLEURSEvaluator:
         
         print(f"✓ Comparison report: {report_path}")
     
-    def _save_intermediate_results(self, predictions, ground_truth, confidences, filename):
-        import pickle
-        checkpoint_path = os.path.join(self.output_dir, filename)
-        checkpoint_data = {
-            'predictions': predictions,
-            'ground_truth': ground_truth,
-            'confidences': confidences,
-            'timestamp': time.time()
-        }
+    def _save_intermediate_results(self, checkpoint_dir: str, start: int, predictions, ground_truth, confidences):
+        if len(predictions) == 0:
+            return
         try:
-            with open(checkpoint_path, 'wb') as f:
-                pickle.dump(checkpoint_data, f)
+            os.makedirs(checkpoint_dir, exist_ok=True)
+            table = pa.Table.from_pydict({
+                'ground_truth': ground_truth,
+                'prediction': predictions,
+                'confidence': confidences
+            }, schema=self.CHECKPOINT_SCHEMA)
+            shard_name = f"shard_{start:08d}.parquet"
+            tmp_path = os.path.join(checkpoint_dir, f".{shard_name}.tmp")
+            pq.write_table(table, tmp_path)
+            os.replace(tmp_path, os.path.join(checkpoint_dir, shard_name))
         except Exception as e:
             print(f"Warning: Could not save checkpoint: {e}")
 
@@ -547,8 +706,10 @@ def main():
     
     EVAL_WHISPER_SUBSET = True
     EVAL_FULL_102 = False
+    BATCH_SIZE = 16
+    INFERENCE_WORKERS = 4
     
-    MODEL_PATH = "whisper_tiny_quantized.onnx"
+    MODEL_PATH = "whisper_lang_detector.onnx"
     CACHE_DIR = ""
     OUTPUT_DIR = "./evaluation_results"
     
@@ -560,7 +721,9 @@ def main():
         dev_samples=DEV_SAMPLES,
         use_82_languages=USE_82_LANGUAGES,
         eval_whisper_subset=EVAL_WHISPER_SUBSET,
-        eval_full_102=EVAL_FULL_102
+        eval_full_102=EVAL_FULL_102,
+        batch_size=BATCH_SIZE,
+        inference_workers=INFERENCE_WORKERS
     )
     
     evaluator.run_full_evaluation()